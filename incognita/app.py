@@ -1,11 +1,17 @@
 import logging
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Tuple
 
 import dash
 import pandas as pd
 from dash import dcc
 from dash import html
+from geopandas import GeoDataFrame
 
-from incognita.database import get_gdf_from_db, get_start_end_date
+from incognita.database import DB_FILE, get_gdf_from_db, get_start_end_date
 from incognita.processing import get_stationary_groups, convert_pd_to_gpd
 from incognita.processing import split_into_trips, add_speed_to_gdf
 from incognita.utils import get_ip_address
@@ -16,7 +22,31 @@ logger = logging.getLogger(__name__)
 
 PORT = 8384
 
+# The db is only written to by the overland server, so a new db mtime means new data and invalidates caches.
+# rendered map HTML keyed by (db mtime, start_date, end_date, show_points), least recently used first.
+# Pages with all points can be many MB, and each gunicorn worker has its own cache, so keep only a few.
+MAP_CACHE_SIZE = 16
+map_cache: "OrderedDict[Tuple[float, str, str, bool], str]" = OrderedDict()
+map_cache_lock = threading.Lock()
+processed_gdf_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _get_processed_gdf(db_mtime: float) -> Tuple[GeoDataFrame, GeoDataFrame]:
+    """Full location history with speeds, plus its stationary points. Recomputed when db_mtime changes."""
+    gdf = add_speed_to_gdf(convert_pd_to_gpd(get_gdf_from_db()))
+    gdf["timestamp"] = pd.to_datetime(gdf["timestamp"])
+    return gdf, get_stationary_groups(gdf)
+
+
+def get_processed_gdf() -> Tuple[GeoDataFrame, GeoDataFrame]:
+    """Return the processed full history and its stationary points, cached until the db changes."""
+    with processed_gdf_lock:  # so concurrent callbacks don't each process the full history
+        return _get_processed_gdf(os.path.getmtime(DB_FILE))
+
+
 app = dash.Dash(__name__, meta_tags=[{"name": "viewport", "content": "width=device-width, initial-scale=1"}])
+server = app.server  # WSGI entrypoint, e.g. `gunicorn incognita.app:server`
 
 
 @app.callback(
@@ -29,22 +59,33 @@ app = dash.Dash(__name__, meta_tags=[{"name": "viewport", "content": "width=devi
 )
 def generate_folium_map(start_date, end_date, checklist_values):
     """Filter GDF based on timestamps provided. Returns HTML repr of Folium map for browser rendering."""
+    cache_key = (os.path.getmtime(DB_FILE), start_date, end_date, bool(checklist_values))
+    with map_cache_lock:
+        if cache_key in map_cache:
+            map_cache.move_to_end(cache_key)
+            return map_cache[cache_key]
+
     start_date = pd.to_datetime(start_date, utc=True).replace(hour=0, minute=0)
     end_date = pd.to_datetime(end_date, utc=True).replace(hour=23, minute=59)
 
-    gdf = add_speed_to_gdf(convert_pd_to_gpd(get_gdf_from_db()))
-    gdf["timestamp"] = pd.to_datetime(gdf["timestamp"])
+    gdf, stationary_points = get_processed_gdf()
     gdf_filtered = gdf[(gdf["timestamp"] >= start_date) & (gdf["timestamp"] <= end_date)]
 
     trips = split_into_trips(gdf_filtered)
 
-    stationary_points = get_stationary_groups(gdf)
     all_points = gdf_filtered if checklist_values else None
-    folium_map = generate_folium(trips, stationary_points, all_points)
-    return folium_map._repr_html_()
+    folium_map_html = generate_folium(trips, stationary_points, all_points)._repr_html_()
+
+    with map_cache_lock:
+        for stale_key in [key for key in map_cache if key[0] != cache_key[0]]:
+            del map_cache[stale_key]
+        map_cache[cache_key] = folium_map_html
+        while len(map_cache) > MAP_CACHE_SIZE:
+            map_cache.popitem(last=False)
+    return folium_map_html
 
 
-gdf = add_speed_to_gdf(convert_pd_to_gpd(get_gdf_from_db()))
+gdf, stationary_points = get_processed_gdf()
 start_date_base, end_date_base = get_start_end_date()
 app.layout = html.Div(
     [
@@ -65,7 +106,7 @@ app.layout = html.Div(
         html.Iframe(
             id="folium_map",
             srcDoc=generate_folium(
-                trips=split_into_trips(gdf), stationary_points=get_stationary_groups(gdf)
+                trips=split_into_trips(gdf), stationary_points=stationary_points
             )._repr_html_(),
             width="100%",
             height="1000",
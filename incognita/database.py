@@ -1,41 +1,78 @@
 import logging
 import sqlite3
-from typing import Tuple
+from typing import Iterable, List, Tuple, Union
 
 import pandas as pd
 from geopandas import GeoDataFrame
 
-from incognita.processing import read_geojson_file, extract_properties_from_geojson
+from incognita.processing import GEOJSON_COLUMNS, read_geojson_file, extract_rows_from_geojson
 
 logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 DB_FILE = "cache/geo_data.db"
+OVERLAND_DTYPES = {"lon": "float64", "lat": "float64", "speed": "float64", "altitude": "float64"}
+# no PRIMARY KEY/UNIQUE constraints: they would have to be maintained on every insert of a bulk load
+CREATE_TABLE_QUERY = (
+    "create table if not exists overland "
+    "(lon REAL, lat REAL, timestamp TEXT, speed REAL, altitude REAL, geojson_file TEXT)"
+)
+INSERT_QUERY = (  # columns in GEOJSON_COLUMNS order
+    "insert into overland (lon, lat, timestamp, speed, altitude, geojson_file) values (?, ?, ?, ?, ?, ?)"
+)
 
 
 def get_gdf_from_db(db_filename: str = DB_FILE) -> pd.DataFrame:
-    """Returned the cached geojson/location dataframe."""
+    """Returned the cached geojson/location dataframe, sorted by timestamp."""
     with sqlite3.connect(db_filename) as conn:
-        df = pd.read_sql('select * from overland', conn)
-    return df.sort_values("timestamp").reset_index(drop=True)
+        return pd.read_sql_query('select * from overland order by timestamp', conn, dtype=OVERLAND_DTYPES)
 
 
 def write_gdf_to_db(gdf: GeoDataFrame, db_filename: str):
     """Write geojson/location dataframe to SQLite db. Raises a ValueError if table already exists."""
     with sqlite3.connect(db_filename) as conn:
-        gdf.to_sql('overland', conn, if_exists='fail', index=False)
+        if conn.execute("select 1 from sqlite_master where type='table' and name='overland'").fetchone():
+            raise ValueError(f"Table 'overland' already exists in {db_filename}.")
+        insert_rows(conn, gdf[list(GEOJSON_COLUMNS)].itertuples(index=False, name=None))
     logger.info(f"wrote: {db_filename=}")
 
 
+def parse_geojson(geojson_filename: str) -> List[Tuple[Union[str, float, None], ...]]:
+    """Read and parse a raw geojson file into rows for the overland table, in GEOJSON_COLUMNS order."""
+    return extract_rows_from_geojson(read_geojson_file(geojson_filename))
+
+
+def insert_rows(conn: sqlite3.Connection, rows: Iterable[Tuple[Union[str, float, None], ...]]):
+    """Insert parsed rows into the overland table, creating it if needed. Does not commit."""
+    conn.execute(CREATE_TABLE_QUERY)
+    conn.executemany(INSERT_QUERY, rows)
+
+
+def create_timestamp_index(db_filename: str = DB_FILE):
+    """Index the overland table on timestamp, for the sorted reads and min/max. Create it after bulk loads."""
+    with sqlite3.connect(db_filename) as conn:
+        conn.execute("create index if not exists overland_timestamp on overland (timestamp)")
+
+
 def update_db(geojson_filename: str, db_filename: str = DB_FILE):
     """Updates db: db_filename with contents of parsed geojson_filename"""
-    raw_geojson = read_geojson_file(geojson_filename)
-    parsed = extract_properties_from_geojson(raw_geojson)
-    df = pd.DataFrame(parsed)
+    update_db_many([geojson_filename], db_filename)
+
+
+def update_db_many(geojson_filenames: List[str], db_filename: str = DB_FILE):
+    """Updates db: db_filename with contents of all parsed geojson_filenames, in a single transaction.
+    Files that fail to parse are logged and skipped, the rest are still written."""
+    rows, num_files = [], 0
+    for geojson_filename in geojson_filenames:
+        try:
+            rows.extend(parse_geojson(geojson_filename))
+            num_files += 1
+        except Exception:
+            logger.exception(f"Skipping unparseable {geojson_filename=}")
 
     with sqlite3.connect(db_filename) as conn:
-        df.to_sql('overland', conn, if_exists='append', index=False)
-    logger.info(f"Updated: {db_filename=} with: {geojson_filename=} size: {df.shape=}")
+        insert_rows(conn, rows)
+    logger.info(f"Updated: {db_filename=} with {num_files} files, size: {len(rows)=}")
 
 
 def get_start_end_date(db_filename: str = DB_FILE) -> Tuple[str, str]:
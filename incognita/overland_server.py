@@ -1,32 +1,63 @@
 """Basic HTTP server to receive and store GPS raw_data from iPhone Overland app."""
 import logging
-import random
-import string
+import os
+import threading
 import time
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Empty, Queue
+from secrets import token_hex
 
-from incognita.database import update_db
+from incognita.database import update_db_many
 from incognita.utils import get_ip_address
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s:%(levelname)s:%(name)s:%(message)s")
 logger = logging.getLogger(__name__)
 PORT = 8383
+CHUNK_SIZE = 64 * 1024
+RAW_DATA_DIR = "raw_data"
+MAX_DB_BATCH_SIZE = 50
+
+db_queue: "Queue[str]" = Queue()
+
+
+def db_worker():
+    """Consume raw file names from db_queue and write them to the db, off the request thread."""
+    while True:
+        file_names = [db_queue.get()]
+        # drain whatever else arrived in the meantime, to write it in the same transaction
+        while len(file_names) < MAX_DB_BATCH_SIZE:
+            try:
+                file_names.append(db_queue.get_nowait())
+            except Empty:
+                break
+
+        try:
+            update_db_many(file_names)
+        except Exception:
+            logger.exception(f"Failed to update db with {file_names=}")
+        finally:
+            for _ in file_names:
+                db_queue.task_done()
 
 
 class StoreHandler(BaseHTTPRequestHandler):
     def do_POST(self):
         """Recieve and store GPS GeoJSON raw_data from iPhone."""
         if self.path == "/store":
-            length = self.headers["content-length"]
-            data = self.rfile.read(int(length))
-            rand = "".join(random.sample(string.ascii_lowercase, 7))
-            file_name = f'raw_data/{time.strftime("%Y%m%d-%H%M%S")}-{rand}.geojson'
+            remaining = int(self.headers["content-length"])
+            file_name = f"{RAW_DATA_DIR}/{time.time_ns()}-{token_hex(4)}.geojson"
 
-            with open(file_name, "w") as fh:
-                fh.write(data.decode())
+            # stream the body to disk in chunks, rather than buffering the whole upload in memory
+            with open(file_name, "wb") as fh:
+                while remaining > 0:
+                    chunk = self.rfile.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    fh.write(chunk)
+                    remaining -= len(chunk)
             logging.info(f"Wrote {file_name=}")
 
-            update_db(file_name)
+            db_queue.put_nowait(file_name)
             self.send_response(200)
             self.send_header("Content-Type", "application/json")
             self.end_headers()
@@ -34,6 +65,8 @@ class StoreHandler(BaseHTTPRequestHandler):
 
 
 if __name__ == "__main__":
-    server = HTTPServer(("", PORT), StoreHandler)
+    os.makedirs(RAW_DATA_DIR, exist_ok=True)
+    threading.Thread(target=db_worker, daemon=True).start()
+    server = ThreadingHTTPServer(("", PORT), StoreHandler)
     logger.info(f"Running server at http://{get_ip_address()}:{PORT}/store")
     server.serve_forever()
@@ -1,16 +1,20 @@
-import json
 import logging
-from glob import glob
-from typing import Union, Dict, List
+import math
+import os
+from itertools import chain
+from typing import Union, Dict, List, Tuple
 
 import numpy as np
+import orjson
 import pandas as pd
 from geopandas import GeoDataFrame, points_from_xy
-from shapely.geometry import LineString, Point
+from shapely.geometry import LineString
 
 logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+GEOJSON_COLUMNS = ("lon", "lat", "timestamp", "speed", "altitude", "geojson_file")
+
 
 def convert_pd_to_gpd(df: pd.DataFrame) -> GeoDataFrame:
     return GeoDataFrame(df, geometry=points_from_xy(df.lon, df.lat))
@@ -18,34 +22,40 @@ def convert_pd_to_gpd(df: pd.DataFrame) -> GeoDataFrame:
 
 def read_geojson_file(filename: str) -> List[Dict]:
     """Return raw geojson entries as list of JSONs, plus source file name. """
-    with open(filename) as f:
-        raw_geojson = json.loads(f.read())["locations"]
-        return [{**d, **{"geojson_file": filename}} for d in raw_geojson]
+    with open(filename, "rb") as f:
+        raw_geojson = orjson.loads(f.read())["locations"]
+    for d in raw_geojson:
+        d["geojson_file"] = filename
+    return raw_geojson
 
 
-def extract_properties_from_geojson(geo_data: List[Dict]) -> List[Dict[str, Union[str, int]]]:
-    """Parse out the relevant contents fem a raw geojson file."""
+def extract_rows_from_geojson(geo_data: List[Dict]) -> List[Tuple[Union[str, float, None], ...]]:
+    """Parse out the relevant contents from a raw geojson file, as tuples in GEOJSON_COLUMNS order."""
     return [
-        {
-            "lon": d["geometry"]["coordinates"][0],
-            "lat": d["geometry"]["coordinates"][1],
-            "timestamp": d["properties"]["timestamp"],
-            "speed": d["properties"].get("speed"),
-            "altitude": d["properties"].get("altitude"),
-            "geojson_file": d["geojson_file"],
-        }
+        (
+            d["geometry"]["coordinates"][0],
+            d["geometry"]["coordinates"][1],
+            d["properties"]["timestamp"],
+            d["properties"].get("speed"),
+            d["properties"].get("altitude"),
+            d["geojson_file"],
+        )
         for d in geo_data
     ]
 
 
+def list_geojson_files(directory: str = "raw_data") -> List[str]:
+    """List the paths of all .geojson files directly in directory, in no particular order."""
+    with os.scandir(directory) as entries:
+        return [entry.path for entry in entries if entry.name.endswith(".geojson") and entry.is_file()]
+
+
 def get_raw_gdf() -> pd.DataFrame:
     """Dump ALL raw json files in /raw_data into a GeoDataFrame. Only keep relevant keys."""
-    geojson_files = glob("raw_data/*.geojson")
-    data_json = sum(
-        [extract_properties_from_geojson(read_geojson_file(f)) for f in geojson_files], []
-    )  # flatten
-    parsed = sorted(data_json, key=lambda x: x["timestamp"])
-    raw_geojson_df = pd.DataFrame(parsed)
+    geojson_files = list_geojson_files()
+    rows = chain.from_iterable(extract_rows_from_geojson(read_geojson_file(f)) for f in geojson_files)
+    raw_geojson_df = pd.DataFrame.from_records(rows, columns=GEOJSON_COLUMNS)
+    raw_geojson_df = raw_geojson_df.sort_values("timestamp", kind="stable", ignore_index=True)
     # gdf = GeoDataFrame(df, geometry=points_from_xy(df.lon, df.lat))  # if we want a GeoDataFrame instead
     logger.info(f"{len(geojson_files)} files found")
     logger.info(f"created: {raw_geojson_df.shape=}")
@@ -53,16 +63,20 @@ def get_raw_gdf() -> pd.DataFrame:
 
 
 def get_haversine_dist(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Get true distance between to coordiantes."""
+    """Get true distance between to coordiantes. Also works elementwise on arrays/Series."""
     radius_earth = 6378137  # Radius of earth in m
-    delta_lat = lat2 * np.pi / 180 - lat1 * np.pi / 180
-    delta_lon = lon2 * np.pi / 180 - lon1 * np.pi / 180
-    a = np.sin(delta_lat / 2) * np.sin(delta_lat / 2) + np.cos(lat1 * np.pi / 180) * np.cos(
-        lat2 * np.pi / 180
-    ) * np.sin(delta_lon / 2) * np.sin(delta_lon / 2)
-    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
-    d = radius_earth * c
-    return d
+    if all(isinstance(x, (int, float)) for x in (lat1, lon1, lat2, lon2)):
+        # scalar fast path: math functions avoid the per-call ufunc dispatch overhead of numpy
+        lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+        a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(
+            (lon2 - lon1) / 2
+        ) ** 2
+        return 2 * radius_earth * math.asin(math.sqrt(a))
+
+    lat1, lon1, lat2, lon2 = np.radians(lat1), np.radians(lon1), np.radians(lat2), np.radians(lon2)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    # arcsin(sqrt(a)) == arctan2(sqrt(a), sqrt(1 - a)) for a in [0, 1], with two fewer passes over the arrays
+    return 2 * radius_earth * np.arcsin(np.sqrt(a))
 
 
 def add_speed_to_gdf(gdf: Union[GeoDataFrame, pd.DataFrame]) -> Union[GeoDataFrame, pd.DataFrame]:
@@ -73,10 +87,18 @@ def add_speed_to_gdf(gdf: Union[GeoDataFrame, pd.DataFrame]) -> Union[GeoDataFra
     Returns:
         dataframe with additional calculated columns
     """
-    gdf["time_diff"] = pd.to_datetime(gdf["timestamp"]).diff(1).apply(lambda x: x.seconds)
-    gdf['meters'] = get_haversine_dist(
-        gdf["lat"].shift(1), gdf["lon"].shift(1), gdf.loc[1:, 'lat'], gdf.loc[1:, 'lon']
-    )
+    # seconds since the previous point, from the int64 nanosecond representation of the timestamps
+    timestamps_ns = pd.to_datetime(gdf["timestamp"], utc=True).to_numpy(dtype="datetime64[ns]").view("i8")
+    time_diff = np.empty(len(gdf))
+    time_diff[:1] = np.nan
+    time_diff[1:] = np.diff(timestamps_ns) / 1e9
+    gdf["time_diff"] = time_diff
+    # distance from the previous point, on raw arrays to avoid pandas index alignment
+    lat, lon = gdf["lat"].to_numpy(dtype=np.float64), gdf["lon"].to_numpy(dtype=np.float64)
+    meters = np.empty(len(gdf))
+    meters[:1] = np.nan
+    meters[1:] = get_haversine_dist(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    gdf['meters'] = meters
     gdf['speed_calc'] = gdf['meters'] / gdf['time_diff']
     gdf["index"] = gdf.index
     return gdf
@@ -92,28 +114,18 @@ def split_into_trips(gdf: Union[GeoDataFrame, pd.DataFrame], max_dist_meters: in
         GeoDataFrame with column trips of dtype Linestring, where each row is a single "trip"
     """
     min_points = 5  # LineString must have at least two points
-    # indicies from gdf to split trips apart on
-    indices_split_trips = list(gdf[gdf["meters"] > max_dist_meters].index)
-    trips = []
-    for i, stop_idx in enumerate(indices_split_trips + [gdf.index[-1]]):
-        # get range of values within one trip
-        start_idx = 0 if i == 0 else indices_split_trips[i - 1]
-        trip_df = gdf.loc[start_idx:stop_idx]
-
-        # ensure they meet the logical conditions of a trip
-        if trip_df.shape[0] <= min_points:
-            continue
-        trip_df = trip_df[trip_df.meters < max_dist_meters]  # remove far away points
-        if trip_df.empty:
-            continue
-
-        # add to dataframe
-        line_string = LineString(trip_df[["lon", "lat"]].values)
-        linestring_gdf = GeoDataFrame([line_string], columns=["geometry"])
-        trips.append(linestring_gdf)
-
-    trips = GeoDataFrame(pd.concat(trips))
-    return trips
+    # label every point with a trip id, which increments at each jump larger than max_dist_meters
+    trip_ids = (gdf["meters"] > max_dist_meters).cumsum()
+    # every trip but the last also counts the break point that ends it (trip_ids is non-decreasing)
+    trip_sizes = trip_ids.map(trip_ids.value_counts()) + (trip_ids != trip_ids.max())
+    # ensure they meet the logical conditions of a trip, and remove far away points
+    is_trip_point = (trip_sizes > min_points) & (gdf["meters"] < max_dist_meters)
+
+    trips = [
+        LineString(trip_df[["lon", "lat"]].values)
+        for _, trip_df in gdf[is_trip_point].groupby(trip_ids[is_trip_point])
+    ]
+    return GeoDataFrame({"geometry": trips}, crs="EPSG:4326")
 
 
 def get_stationary_groups(
@@ -138,6 +150,6 @@ def get_stationary_groups(
     stationary_groups["num_points"] = stationary_groups["lat"].apply(len)
     stationary_groups["lat"] = stationary_groups["lat"].apply(np.mean)
     stationary_groups["lon"] = stationary_groups["lon"].apply(np.mean)
-    stationary_groups["geometry"] = stationary_groups.apply(lambda x: Point(x.lon, x.lat), axis=1)
+    stationary_groups["geometry"] = points_from_xy(stationary_groups.lon, stationary_groups.lat)
 
     return stationary_groups
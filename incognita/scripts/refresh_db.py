@@ -1,19 +1,46 @@
 import logging
 import os
-from glob import glob
+import sqlite3
+from multiprocessing import Pool
 
 from tqdm import tqdm
 
-from incognita.database import update_db
+from incognita.database import CREATE_TABLE_QUERY, DB_FILE, create_timestamp_index, insert_rows, parse_geojson
+from incognita.processing import list_geojson_files
 
 logger = logging.getLogger("incognita.database")
 logger.setLevel(logging.WARNING)
 
-DB_FILE = "cache/geo_data.db"
+# The db is rebuilt from scratch and nothing else reads it meanwhile, so skip journaling and fsyncs.
+# If the load is interrupted, the db may be corrupt - just rerun this script.
+BULK_LOAD_PRAGMAS = (
+    "PRAGMA journal_mode=OFF",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA locking_mode=EXCLUSIVE",
+    "PRAGMA temp_store=MEMORY",
+)
+PARSE_CHUNKSIZE = 32  # raw files are small, so send them to the pool workers in chunks
 
-if os.path.exists(DB_FILE):
-    os.remove(DB_FILE)
 
-geo_files = glob("raw_data/*.geojson")
-for f in tqdm(geo_files):
-    update_db(f, DB_FILE)
+def main():
+    if os.path.exists(DB_FILE):
+        os.remove(DB_FILE)
+
+    geo_files = list_geojson_files()
+    conn = sqlite3.connect(DB_FILE)
+    for pragma in BULK_LOAD_PRAGMAS:
+        conn.execute(pragma)
+    conn.execute(CREATE_TABLE_QUERY)  # up front, so the table exists even if there are no raw files
+
+    # parse in parallel, but only write from this process (SQLite allows a single writer) in one transaction.
+    # Insertion order doesn't matter, the db is read sorted by timestamp.
+    with Pool() as pool, conn:
+        rows_per_file = pool.imap_unordered(parse_geojson, geo_files, chunksize=PARSE_CHUNKSIZE)
+        for rows in tqdm(rows_per_file, total=len(geo_files)):
+            insert_rows(conn, rows)
+    conn.close()  # releases the exclusive lock
+    create_timestamp_index(DB_FILE)
+
+
+if __name__ == "__main__":
+    main()
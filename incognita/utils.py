@@ -1,10 +1,12 @@
 import socket
+from functools import lru_cache
 
 
+@lru_cache(maxsize=1)
 def get_ip_address() -> str:
-    """Get the IP address of the current server."""
+    """Get the IP address of the current server. Cached, it doesn't change during a process' lifetime."""
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    s.connect(("8.8.8.8", 100))
+    s.connect(("8.8.8.8", 80))  # UDP connect sends no packets, it only selects the outbound interface
     socket_name = s.getsockname()
     s.close()
     return socket_name[0]